@@ -3,7 +3,52 @@
 import hashlib
 import hmac
 import time
-from typing import Dict
+from functools import lru_cache
+from typing import Dict, Optional, Tuple
+
+
+@lru_cache(maxsize=4)
+def _secret_bytes(shared_secret: str) -> bytes:
+    """UTF-8 encode a shared secret once and reuse it."""
+    return shared_secret.encode('utf-8')
+
+
+# SHA-256 block size in bytes, used to build the HMAC key pads (RFC 2104)
+_BLOCK_SIZE = 64
+_IPAD = bytes(b ^ 0x36 for b in range(256))
+_OPAD = bytes(b ^ 0x5C for b in range(256))
+
+
+@lru_cache(maxsize=4)
+def _hmac_pads(secret_bytes: bytes) -> Tuple["hashlib._Hash", "hashlib._Hash"]:
+    """
+    Build SHA-256 contexts pre-seeded with the HMAC inner and outer key pads.
+    
+    The key pads are absorbed once per secret; callers must ``.copy()`` both
+    contexts before feeding them a message.
+    """
+    if len(secret_bytes) > _BLOCK_SIZE:
+        secret_bytes = hashlib.sha256(secret_bytes).digest()
+    key_block = secret_bytes.ljust(_BLOCK_SIZE, b"\x00")
+    inner = hashlib.sha256(key_block.translate(_IPAD))
+    outer = hashlib.sha256(key_block.translate(_OPAD))
+    return inner, outer
+
+
+@lru_cache(maxsize=256)
+def _sign(secret_bytes: bytes, message: bytes) -> str:
+    """
+    Compute the hex HMAC-SHA256 of ``message`` using the cached key pads.
+    
+    Messages embed a one-second timestamp, so requests to the same endpoint
+    within the same second share a single HMAC computation.
+    """
+    inner_base, outer_base = _hmac_pads(secret_bytes)
+    inner = inner_base.copy()
+    inner.update(message)
+    outer = outer_base.copy()
+    outer.update(inner.digest())
+    return outer.hexdigest()
 
 
 def generate_auth_headers(
@@ -24,21 +69,43 @@ def generate_auth_headers(
     Returns:
         Dictionary with X-Timestamp and X-Signature headers
     """
-    # Current Unix timestamp
-    timestamp = str(int(time.time()))
+    return generate_auth_headers_b(
+        method.encode('utf-8'),
+        path.encode('utf-8'),
+        _secret_bytes(shared_secret),
+    )
+
+
+def generate_auth_headers_b(
+    method: bytes,
+    path: bytes,
+    secret_bytes: bytes,
+    ts_bytes: Optional[bytes] = None,
+) -> Dict[str, str]:
+    """
+    Generate authentication headers from pre-encoded request components.
     
-    # Build the message to sign
-    message = f"{method}:{path}:{timestamp}"
+    Same as generate_auth_headers, for callers that keep the method, path
+    and secret as UTF-8 bytes so nothing is re-encoded per request.
+    
+    Args:
+        method: HTTP method as bytes (e.g., b"GET")
+        path: Request path as bytes (e.g., b"/photos")
+        secret_bytes: The UTF-8 encoded shared secret
+        ts_bytes: Unix timestamp as ASCII bytes (defaults to now)
+    
+    Returns:
+        Dictionary with X-Timestamp and X-Signature headers
+    """
+    # Current Unix timestamp
+    if ts_bytes is None:
+        ts_bytes = b"%d" % (time.time_ns() // 1_000_000_000)
     
-    # Calculate HMAC-SHA256 signature
-    signature = hmac.new(
-        key=shared_secret.encode('utf-8'),
-        msg=message.encode('utf-8'),
-        digestmod=hashlib.sha256
-    ).hexdigest()
+    # Build the message to sign and calculate the HMAC-SHA256 signature
+    signature = _sign(secret_bytes, b"%s:%s:%s" % (method, path, ts_bytes))
     
     return {
-        "X-Timestamp": timestamp,
+        "X-Timestamp": ts_bytes.decode('ascii'),
         "X-Signature": signature,
     }
 
@@ -68,7 +135,7 @@ def verify_signature(
     # Check timestamp age
     try:
         request_time = int(timestamp)
-        current_time = int(time.time())
+        current_time = time.time_ns() // 1_000_000_000
         if abs(current_time - request_time) > max_age_seconds:
             return False
     except ValueError:
@@ -76,11 +143,7 @@ def verify_signature(
     
     # Calculate expected signature
     message = f"{method}:{path}:{timestamp}"
-    expected_signature = hmac.new(
-        key=shared_secret.encode('utf-8'),
-        msg=message.encode('utf-8'),
-        digestmod=hashlib.sha256
-    ).hexdigest()
+    expected_signature = _sign(_secret_bytes(shared_secret), message.encode('utf-8'))
     
     # Constant-time comparison
     return hmac.compare_digest(signature.lower(), expected_signature.lower())
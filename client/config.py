@@ -1,7 +1,10 @@
 """Configuration management for PhotoShare client."""
 
 import os
+from dataclasses import dataclass
 from pathlib import Path
+from typing import Mapping
+
 from dotenv import load_dotenv
 
 # Load environment variables from .env file in project root
@@ -16,23 +19,61 @@ else:
     load_dotenv()  # Fall back to default behavior
 
 
+@dataclass(frozen=True)
+class Settings:
+    """Settings resolved from the environment."""
+    
+    SERVER_URL: str
+    SHARED_SECRET: str
+    POLL_INTERVAL_HOURS: int
+    DOWNLOAD_DIR: Path
+    STATE_FILE: Path
+    REQUEST_TIMEOUT: int
+    MAX_RETRIES: int
+    MAX_CONCURRENT_DOWNLOADS: int
+
+
+def build_config(env: Mapping[str, str] = os.environ) -> Settings:
+    """Resolve every setting from ``env`` in a single pass."""
+    get = env.get
+    return Settings(
+        # Server connection
+        SERVER_URL=get("PHOTOSHARE_SERVER_URL", "http://localhost:8080"),
+        SHARED_SECRET=get("PHOTOSHARE_SECRET", "development-secret-change-me"),
+        # Sync settings
+        POLL_INTERVAL_HOURS=int(get("PHOTOSHARE_POLL_INTERVAL", "1")),
+        DOWNLOAD_DIR=Path(get("PHOTOSHARE_DOWNLOAD_DIR", "./downloads")),
+        # State file to track last sync timestamp
+        STATE_FILE=Path(get("PHOTOSHARE_STATE_FILE", "./.sync_state")),
+        # Request settings
+        REQUEST_TIMEOUT=int(get("PHOTOSHARE_TIMEOUT", "300")),  # 5 minutes for large files
+        MAX_RETRIES=int(get("PHOTOSHARE_MAX_RETRIES", "3")),
+        # At least one download must run, or the sync would never progress
+        MAX_CONCURRENT_DOWNLOADS=max(1, int(get("PHOTOSHARE_MAX_CONCURRENT_DOWNLOADS", "8"))),
+    )
+
+
+_settings = build_config()
+
+
 class Config:
     """Application configuration loaded from environment variables."""
     
     # Server connection
-    SERVER_URL: str = os.getenv("PHOTOSHARE_SERVER_URL", "http://localhost:8080")
-    SHARED_SECRET: str = os.getenv("PHOTOSHARE_SECRET", "development-secret-change-me")
+    SERVER_URL: str = _settings.SERVER_URL
+    SHARED_SECRET: str = _settings.SHARED_SECRET
     
     # Sync settings
-    POLL_INTERVAL_HOURS: int = int(os.getenv("PHOTOSHARE_POLL_INTERVAL", "1"))
-    DOWNLOAD_DIR: Path = Path(os.getenv("PHOTOSHARE_DOWNLOAD_DIR", "./downloads"))
+    POLL_INTERVAL_HOURS: int = _settings.POLL_INTERVAL_HOURS
+    DOWNLOAD_DIR: Path = _settings.DOWNLOAD_DIR
     
     # State file to track last sync timestamp
-    STATE_FILE: Path = Path(os.getenv("PHOTOSHARE_STATE_FILE", "./.sync_state"))
+    STATE_FILE: Path = _settings.STATE_FILE
     
     # Request settings
-    REQUEST_TIMEOUT: int = int(os.getenv("PHOTOSHARE_TIMEOUT", "300"))  # 5 minutes for large files
-    MAX_RETRIES: int = int(os.getenv("PHOTOSHARE_MAX_RETRIES", "3"))
+    REQUEST_TIMEOUT: int = _settings.REQUEST_TIMEOUT
+    MAX_RETRIES: int = _settings.MAX_RETRIES
+    MAX_CONCURRENT_DOWNLOADS: int = _settings.MAX_CONCURRENT_DOWNLOADS
     
     @classmethod
     def validate(cls) -> bool:
@@ -11,13 +11,12 @@ Options:
 """
 
 import argparse
+import asyncio
 import logging
 import signal
 import sys
-import time
 from datetime import datetime
-
-import schedule
+from typing import Optional
 
 from config import Config
 from sync import PhotoSyncClient
@@ -30,30 +29,47 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# Global flag for graceful shutdown
-shutdown_requested = False
-
 
-def signal_handler(signum, frame):
+def signal_handler(shutdown_event: asyncio.Event):
     """Handle shutdown signals gracefully."""
-    global shutdown_requested
     logger.info("Shutdown signal received, finishing current operation...")
-    shutdown_requested = True
+    shutdown_event.set()
+
+
+# Sync client shared across scheduled runs so its connection pool stays warm
+_sync_client: Optional[PhotoSyncClient] = None
+
+
+def get_or_create_client(interval_hours: Optional[int] = None) -> PhotoSyncClient:
+    """Return the shared sync client, creating it on first use."""
+    global _sync_client
+    if _sync_client is None:
+        _sync_client = PhotoSyncClient(poll_interval_hours=interval_hours)
+    return _sync_client
 
 
-def run_sync():
+def close_client():
+    """Close the shared sync client, if one was created."""
+    global _sync_client
+    if _sync_client is not None:
+        _sync_client.close()
+        _sync_client = None
+
+
+def run_sync(interval_hours: Optional[int] = None):
     """Execute a single sync operation."""
     logger.info(f"=== Sync started at {datetime.now().isoformat()} ===")
     
     try:
-        with PhotoSyncClient() as client:
-            # Check server health first
-            if not client.check_health():
-                logger.error("Server health check failed, skipping sync")
-                return
-            
-            downloaded = client.sync()
-            logger.info(f"Sync completed: {downloaded} photos downloaded")
+        client = get_or_create_client(interval_hours)
+        
+        # Check server health first
+        if not client.check_health():
+            logger.error("Server health check failed, skipping sync")
+            return
+        
+        downloaded = client.sync()
+        logger.info(f"Sync completed: {downloaded} photos downloaded")
             
     except Exception as e:
         logger.exception(f"Sync failed with error: {e}")
@@ -83,30 +99,38 @@ def main():
     logger.info(f"Server: {Config.SERVER_URL}")
     logger.info(f"Download directory: {Config.DOWNLOAD_DIR}")
     
+    try:
+        asyncio.run(run(args))
+    finally:
+        close_client()
+
+
+async def run(args):
+    """Run a single sync, or sync every ``args.interval`` hours until shutdown."""
     # Set up signal handlers
-    signal.signal(signal.SIGINT, signal_handler)
-    signal.signal(signal.SIGTERM, signal_handler)
+    shutdown_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, signal_handler, shutdown_event)
     
     if args.once:
         # Single sync mode
-        run_sync()
-    else:
-        # Continuous polling mode
-        interval_hours = args.interval
-        logger.info(f"Starting continuous sync every {interval_hours} hour(s)")
-        
-        # Run immediately on startup
-        run_sync()
-        
-        # Schedule periodic runs
-        schedule.every(interval_hours).hours.do(run_sync)
-        
-        # Main loop
-        while not shutdown_requested:
-            schedule.run_pending()
-            time.sleep(60)  # Check every minute
-        
-        logger.info("Shutdown complete")
+        await asyncio.to_thread(run_sync)
+        return
+    
+    # Continuous polling mode
+    interval_hours = args.interval
+    logger.info(f"Starting continuous sync every {interval_hours} hour(s)")
+    
+    # Run immediately on startup, then sleep until the next run or a shutdown signal
+    while not shutdown_event.is_set():
+        await asyncio.to_thread(run_sync, interval_hours)
+        try:
+            await asyncio.wait_for(shutdown_event.wait(), timeout=interval_hours * 3600)
+        except asyncio.TimeoutError:
+            pass
+    
+    logger.info("Shutdown complete")
 
 
 if __name__ == "__main__":
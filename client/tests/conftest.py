@@ -0,0 +1,43 @@
+"""Shared pytest configuration for the client tests."""
+
+import hashlib
+
+import pytest
+
+try:
+    import _hashlib
+except ImportError:  # Python built without OpenSSL
+    _hashlib = None
+
+
+def pytest_configure(config):
+    """Abort the run if hashlib's SHA-256 is not the OpenSSL implementation."""
+    if _hashlib is None or hashlib.sha256 is not _hashlib.openssl_sha256:
+        raise pytest.UsageError(
+            "hashlib.sha256 is not OpenSSL-backed; rebuild Python against OpenSSL "
+            "so HMAC-SHA256 uses the accelerated implementation"
+        )
+
+
+@pytest.fixture(scope="session")
+def sha256():
+    """OpenSSL SHA-256 constructor; lets hmac dispatch straight to OpenSSL's HMAC."""
+    return _hashlib.openssl_sha256
+
+
+@pytest.fixture(scope="session")
+def live_photo_multipart():
+    """(boundary, body) of a multipart response shaped like the server's Live Photo response."""
+    boundary = "test-boundary-12345"
+    body = (
+        f"--{boundary}\r\n"
+        'Content-Disposition: form-data; name="photo"; filename="IMG_LIVE.heic"\r\n'
+        "Content-Type: image/heic\r\n\r\n"
+        "fake heic data"
+        f"\r\n--{boundary}\r\n"
+        'Content-Disposition: form-data; name="video"; filename="IMG_LIVE.mov"\r\n'
+        "Content-Type: video/quicktime\r\n\r\n"
+        "fake video data"
+        f"\r\n--{boundary}--\r\n"
+    ).encode()
+    return boundary, body
@@ -1,18 +1,49 @@
 """Unit tests for the auth module."""
 
-import hashlib
 import hmac
 import time
 from unittest.mock import patch
 
 import pytest
 
-from auth import generate_auth_headers, verify_signature
+from auth import _sign, generate_auth_headers, generate_auth_headers_b, verify_signature
+
+
+# Signing inputs shared by the expected-signature computations below
+_SECRET = b"test-secret"
+_PATH_PREFIX = b"GET:/photos:"
+
+# The real clock, kept before any test patches ``time.time_ns``
+_time_ns = time.time_ns
+
+
+@pytest.fixture
+def now():
+    """Current Unix time in whole seconds, read once per test."""
+    return int(time.time())
+
+
+@pytest.fixture(scope="session")
+def hmac_base(sha256):
+    """Keyed HMAC-SHA256 for "test-secret"; ``.copy()`` it before adding a message."""
+    return hmac.new(_SECRET, b"", sha256)
 
 
 class TestGenerateAuthHeaders:
     """Tests for generate_auth_headers function."""
     
+    @pytest.fixture(autouse=True, scope="class")
+    def _freeze_time(self):
+        """Pin the signing clock to 1700000000 for the whole class."""
+        with patch('auth.time.time_ns', return_value=1700000000 * 10**9):
+            yield
+    
+    @pytest.fixture
+    def real_time(self):
+        """Undo ``_freeze_time`` for tests that need the wall clock."""
+        with patch('auth.time.time_ns', _time_ns):
+            yield
+    
     def test_returns_required_headers(self):
         """Should return both X-Timestamp and X-Signature headers."""
         headers = generate_auth_headers("GET", "/photos", "secret")
@@ -20,144 +51,104 @@ class TestGenerateAuthHeaders:
         assert "X-Timestamp" in headers
         assert "X-Signature" in headers
     
-    def test_timestamp_is_current(self):
+    def test_timestamp_is_current(self, real_time, now):
         """Timestamp should be close to current time."""
-        before = int(time.time())
         headers = generate_auth_headers("GET", "/photos", "secret")
-        after = int(time.time())
         
         timestamp = int(headers["X-Timestamp"])
-        assert before <= timestamp <= after
+        assert now - 1 <= timestamp <= now + 1
     
     def test_signature_format(self):
         """Signature should be a hex string."""
         headers = generate_auth_headers("GET", "/photos", "secret")
         
         signature = headers["X-Signature"]
-        # SHA256 produces 64 hex characters
-        assert len(signature) == 64
-        assert all(c in "0123456789abcdef" for c in signature)
+        # SHA256 produces 32 bytes, hex-encoded
+        try:
+            assert len(bytes.fromhex(signature)) == 32
+        except ValueError:
+            pytest.fail(f"Signature is not hex: {signature!r}")
+        assert signature == signature.lower()
     
     def test_signature_is_deterministic_for_same_timestamp(self):
         """Same inputs should produce same signature."""
-        with patch('auth.time.time', return_value=1700000000):
-            headers1 = generate_auth_headers("GET", "/photos", "secret")
-            headers2 = generate_auth_headers("GET", "/photos", "secret")
+        headers1 = generate_auth_headers("GET", "/photos", "secret")
+        headers2 = generate_auth_headers("GET", "/photos", "secret")
         
         assert headers1["X-Signature"] == headers2["X-Signature"]
     
-    def test_signature_differs_for_different_methods(self):
-        """Different methods should produce different signatures."""
-        with patch('auth.time.time', return_value=1700000000):
-            headers_get = generate_auth_headers("GET", "/photos", "secret")
-            headers_post = generate_auth_headers("POST", "/photos", "secret")
-        
-        assert headers_get["X-Signature"] != headers_post["X-Signature"]
-    
-    def test_signature_differs_for_different_paths(self):
-        """Different paths should produce different signatures."""
-        with patch('auth.time.time', return_value=1700000000):
-            headers1 = generate_auth_headers("GET", "/photos", "secret")
-            headers2 = generate_auth_headers("GET", "/photos/123", "secret")
+    @pytest.mark.parametrize("a, b", [
+        (("GET", "/photos", "secret"), ("POST", "/photos", "secret")),
+        (("GET", "/photos", "secret"), ("GET", "/photos/123", "secret")),
+        (("GET", "/photos", "secret1"), ("GET", "/photos", "secret2")),
+    ], ids=["method", "path", "secret"])
+    def test_signature_differs(self, a, b):
+        """Changing the method, path or secret should change the signature."""
+        headers1 = generate_auth_headers(*a)
+        headers2 = generate_auth_headers(*b)
         
         assert headers1["X-Signature"] != headers2["X-Signature"]
     
-    def test_signature_differs_for_different_secrets(self):
-        """Different secrets should produce different signatures."""
-        with patch('auth.time.time', return_value=1700000000):
-            headers1 = generate_auth_headers("GET", "/photos", "secret1")
-            headers2 = generate_auth_headers("GET", "/photos", "secret2")
-        
-        assert headers1["X-Signature"] != headers2["X-Signature"]
-    
-    def test_signature_matches_expected_format(self):
+    def test_signature_matches_expected_format(self, hmac_base):
         """Verify signature matches HMAC-SHA256 of expected message."""
         secret = "test-secret"
         method = "GET"
         path = "/photos"
         
-        with patch('auth.time.time', return_value=1700000000):
-            headers = generate_auth_headers(method, path, secret)
+        headers = generate_auth_headers(method, path, secret)
         
         # Manually compute expected signature
-        message = f"{method}:{path}:1700000000"
-        expected = hmac.new(
-            secret.encode('utf-8'),
-            message.encode('utf-8'),
-            hashlib.sha256
-        ).hexdigest()
+        h = hmac_base.copy()
+        h.update(_PATH_PREFIX + b"1700000000")
+        expected = h.hexdigest()
         
         assert headers["X-Signature"] == expected
-
-
-class TestVerifySignature:
-    """Tests for verify_signature function."""
     
-    def test_accepts_valid_signature(self):
-        """Should accept a valid signature."""
-        secret = "test-secret"
-        timestamp = str(int(time.time()))
-        message = f"GET:/photos:{timestamp}"
-        signature = hmac.new(
-            secret.encode('utf-8'),
-            message.encode('utf-8'),
-            hashlib.sha256
-        ).hexdigest()
+    def test_bytes_variant_matches_str_variant(self):
+        """Pre-encoded inputs should produce the same headers as str inputs."""
+        headers = generate_auth_headers("GET", "/photos", "test-secret")
+        headers_b = generate_auth_headers_b(b"GET", b"/photos", _SECRET)
         
-        assert verify_signature("GET", "/photos", timestamp, signature, secret)
+        assert headers_b == headers
     
-    def test_rejects_invalid_signature(self):
-        """Should reject an invalid signature."""
-        timestamp = str(int(time.time()))
+    def test_bytes_variant_uses_given_timestamp(self):
+        """An explicit timestamp should be signed and echoed back as a str."""
+        headers = generate_auth_headers_b(b"GET", b"/photos", _SECRET, b"1700000000")
         
-        assert not verify_signature(
-            "GET", "/photos", timestamp, "invalid-signature", "secret"
-        )
-    
-    def test_rejects_expired_timestamp(self):
-        """Should reject timestamps older than max_age_seconds."""
-        secret = "test-secret"
-        old_timestamp = str(int(time.time()) - 600)  # 10 minutes ago
-        message = f"GET:/photos:{old_timestamp}"
-        signature = hmac.new(
-            secret.encode('utf-8'),
-            message.encode('utf-8'),
-            hashlib.sha256
-        ).hexdigest()
-        
-        # Default max_age is 300 seconds (5 minutes)
-        assert not verify_signature(
-            "GET", "/photos", old_timestamp, signature, secret
+        assert headers["X-Timestamp"] == "1700000000"
+        assert verify_signature(
+            "GET", "/photos", "1700000000", headers["X-Signature"], "test-secret",
+            max_age_seconds=10**10,
         )
+
+
+class TestVerifySignature:
+    """Tests for verify_signature function."""
     
-    def test_accepts_recent_timestamp(self):
-        """Should accept timestamps within max_age_seconds."""
-        secret = "test-secret"
-        recent_timestamp = str(int(time.time()) - 120)  # 2 minutes ago
-        message = f"GET:/photos:{recent_timestamp}"
-        signature = hmac.new(
-            secret.encode('utf-8'),
-            message.encode('utf-8'),
-            hashlib.sha256
-        ).hexdigest()
+    @pytest.mark.parametrize("offset, expected", [
+        (0, True),       # current
+        (-120, True),    # 2 minutes ago
+        (-400, False),   # 6.7 minutes ago
+        (-600, False),   # 10 minutes ago
+        (+600, False),   # 10 minutes from now
+    ])
+    def test_timestamp_window(self, hmac_base, now, offset, expected):
+        """Should accept only timestamps within the default 300 second window."""
+        timestamp = str(now + offset)
+        h = hmac_base.copy()
+        h.update(_PATH_PREFIX + timestamp.encode())
+        signature = h.hexdigest()
         
         assert verify_signature(
-            "GET", "/photos", recent_timestamp, signature, secret
-        )
+            "GET", "/photos", timestamp, signature, "test-secret"
+        ) is expected
     
-    def test_rejects_future_timestamp(self):
-        """Should reject timestamps too far in the future."""
-        secret = "test-secret"
-        future_timestamp = str(int(time.time()) + 600)  # 10 minutes from now
-        message = f"GET:/photos:{future_timestamp}"
-        signature = hmac.new(
-            secret.encode('utf-8'),
-            message.encode('utf-8'),
-            hashlib.sha256
-        ).hexdigest()
+    def test_rejects_invalid_signature(self, now):
+        """Should reject an invalid signature."""
+        timestamp = str(now)
         
         assert not verify_signature(
-            "GET", "/photos", future_timestamp, signature, secret
+            "GET", "/photos", timestamp, "invalid-signature", "secret"
         )
     
     def test_rejects_invalid_timestamp_format(self):
@@ -166,16 +157,13 @@ class TestVerifySignature:
             "GET", "/photos", "not-a-number", "signature", "secret"
         )
     
-    def test_signature_comparison_is_case_insensitive(self):
+    def test_signature_comparison_is_case_insensitive(self, hmac_base, now):
         """Should accept signatures regardless of case."""
         secret = "test-secret"
-        timestamp = str(int(time.time()))
-        message = f"GET:/photos:{timestamp}"
-        signature = hmac.new(
-            secret.encode('utf-8'),
-            message.encode('utf-8'),
-            hashlib.sha256
-        ).hexdigest()
+        timestamp = str(now)
+        h = hmac_base.copy()
+        h.update(_PATH_PREFIX + timestamp.encode())
+        signature = h.hexdigest()
         
         # Test uppercase
         assert verify_signature(
@@ -187,16 +175,13 @@ class TestVerifySignature:
             "GET", "/photos", timestamp, signature.lower(), secret
         )
     
-    def test_custom_max_age(self):
+    def test_custom_max_age(self, hmac_base, now):
         """Should respect custom max_age_seconds parameter."""
         secret = "test-secret"
-        old_timestamp = str(int(time.time()) - 400)  # 6.7 minutes ago
-        message = f"GET:/photos:{old_timestamp}"
-        signature = hmac.new(
-            secret.encode('utf-8'),
-            message.encode('utf-8'),
-            hashlib.sha256
-        ).hexdigest()
+        old_timestamp = str(now - 400)  # 6.7 minutes ago
+        h = hmac_base.copy()
+        h.update(_PATH_PREFIX + old_timestamp.encode())
+        signature = h.hexdigest()
         
         # Should fail with default 300 seconds
         assert not verify_signature(
@@ -210,3 +195,14 @@ class TestVerifySignature:
             max_age_seconds=600
         )
 
+
+class TestSign:
+    """Tests for the _sign function."""
+    
+    @pytest.mark.parametrize("key_length", [0, 64, 65, 200])
+    def test_matches_hmac_module(self, sha256, key_length):
+        """Should match hmac for keys up to, at and beyond the 64-byte block size."""
+        key = bytes(range(256))[:key_length]
+        message = _PATH_PREFIX + b"1700000000"
+        
+        assert _sign(key, message) == hmac.new(key, message, sha256).hexdigest()
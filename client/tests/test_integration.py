@@ -4,12 +4,13 @@ These tests verify the client works correctly with a mock server.
 For real integration testing, run with a live server.
 """
 
-import hashlib
 import hmac
 import json
-import tempfile
+import shutil
 import time
-from pathlib import Path
+from functools import lru_cache
+from types import SimpleNamespace
+from typing import Optional
 from unittest.mock import MagicMock, patch
 
 import httpx
@@ -19,28 +20,95 @@ from auth import generate_auth_headers
 from sync import PhotoSyncClient
 
 
+# Listing returned by the mock server in the full sync flow
+_PHOTOS_RESPONSE = {
+    "count": 2,
+    "photos": [
+        {
+            "id": "ABC123/L0/001",
+            "creationDate": "2024-01-15T10:30:00Z",
+            "modificationDate": "2024-01-15T10:30:00Z",
+            "mediaType": "image",
+            "mediaSubtypes": [],
+            "pixelWidth": 4032,
+            "pixelHeight": 3024,
+            "duration": 0,
+            "isFavorite": False,
+            "isHidden": False,
+            "location": None,
+        },
+        {
+            "id": "DEF456/L0/002",
+            "creationDate": "2024-01-16T14:20:00Z",
+            "modificationDate": "2024-01-16T14:20:00Z",
+            "mediaType": "video",
+            "mediaSubtypes": [],
+            "pixelWidth": 1920,
+            "pixelHeight": 1080,
+            "duration": 30.5,
+            "isFavorite": True,
+            "isHidden": False,
+            "location": {
+                "latitude": 37.7749,
+                "longitude": -122.4194,
+                "altitude": 10.5
+            },
+        },
+    ]
+}
+
+_LIST_RESP = httpx.Response(200, json=_PHOTOS_RESPONSE)
+
+
+@lru_cache(maxsize=None)
+def _make_download_response(
+    filename: str, content: bytes, media_type: str, creation_date: Optional[str] = None
+) -> httpx.Response:
+    """Streamed download response for a single-file asset, built once per signature."""
+    headers = {"X-Original-Filename": filename, "X-Media-Type": media_type}
+    if creation_date:
+        headers["X-Creation-Date"] = creation_date
+    return httpx.Response(200, headers=headers, content=content)
+
+
 class TestClientServerInteraction:
     """Tests simulating client-server interaction."""
     
-    @pytest.fixture
-    def temp_dir(self):
-        """Create a temporary directory for tests."""
-        with tempfile.TemporaryDirectory() as tmpdir:
-            yield Path(tmpdir)
+    @pytest.fixture(scope="class")
+    def temp_dir(self, tmp_path_factory):
+        """Create a temporary directory shared by the tests in this class."""
+        return tmp_path_factory.mktemp("downloads", numbered=True)
     
-    @pytest.fixture
+    @pytest.fixture(scope="class")
     def mock_config(self, temp_dir):
         """Create a mock config for testing."""
-        config = MagicMock()
-        config.SERVER_URL = "http://localhost:8080"
-        config.SHARED_SECRET = "integration-test-secret"
-        config.DOWNLOAD_DIR = temp_dir / "downloads"
-        config.STATE_FILE = temp_dir / ".sync_state"
-        config.REQUEST_TIMEOUT = 30
-        config.ensure_directories = MagicMock()
-        return config
+        return SimpleNamespace(
+            SERVER_URL="http://localhost:8080",
+            SHARED_SECRET="integration-test-secret",
+            DOWNLOAD_DIR=temp_dir / "downloads",
+            STATE_FILE=temp_dir / ".sync_state",
+            REQUEST_TIMEOUT=30,
+            MAX_CONCURRENT_DOWNLOADS=2,
+            POLL_INTERVAL_HOURS=1,
+            ensure_directories=lambda: None,
+        )
+    
+    @pytest.fixture(scope="class")
+    def shared_client(self, mock_config):
+        """One PhotoSyncClient (and httpx pool) for every test in the class."""
+        with PhotoSyncClient(mock_config) as client:
+            yield client
+    
+    @pytest.fixture
+    def client(self, shared_client, mock_config):
+        """The shared client, with per-test state reset afterwards."""
+        http_client = shared_client._client
+        yield shared_client
+        shared_client._client = http_client
+        shutil.rmtree(mock_config.DOWNLOAD_DIR, ignore_errors=True)
+        mock_config.STATE_FILE.unlink(missing_ok=True)
     
-    def test_auth_headers_match_server_expectations(self):
+    def test_auth_headers_match_server_expectations(self, sha256):
         """Verify client auth headers match server HMAC verification."""
         secret = "shared-secret"
         method = "GET"
@@ -55,96 +123,46 @@ class TestClientServerInteraction:
         
         # Server verification logic
         message = f"{method}:{path}:{timestamp}"
-        expected_signature = hmac.new(
-            secret.encode('utf-8'),
-            message.encode('utf-8'),
-            hashlib.sha256
-        ).hexdigest()
+        h = hmac.new(secret.encode('utf-8'), message.encode('utf-8'), sha256)
+        expected_signature = h.hexdigest()
         
-        assert signature.lower() == expected_signature.lower()
+        # Both sides emit lowercase hex, so compare the bytes directly
+        assert hmac.compare_digest(signature.encode(), expected_signature.encode())
     
-    def test_full_sync_flow(self, mock_config, temp_dir):
+    def test_full_sync_flow(self, client, mock_config):
         """Test complete sync flow from list to download."""
         mock_config.DOWNLOAD_DIR.mkdir(parents=True, exist_ok=True)
         
-        # Mock server responses
-        photos_response = {
-            "count": 2,
-            "photos": [
-                {
-                    "id": "ABC123/L0/001",
-                    "creationDate": "2024-01-15T10:30:00Z",
-                    "modificationDate": "2024-01-15T10:30:00Z",
-                    "mediaType": "image",
-                    "mediaSubtypes": [],
-                    "pixelWidth": 4032,
-                    "pixelHeight": 3024,
-                    "duration": 0,
-                    "isFavorite": False,
-                    "isHidden": False,
-                    "location": None,
-                },
-                {
-                    "id": "DEF456/L0/002",
-                    "creationDate": "2024-01-16T14:20:00Z",
-                    "modificationDate": "2024-01-16T14:20:00Z",
-                    "mediaType": "video",
-                    "mediaSubtypes": [],
-                    "pixelWidth": 1920,
-                    "pixelHeight": 1080,
-                    "duration": 30.5,
-                    "isFavorite": True,
-                    "isHidden": False,
-                    "location": {
-                        "latitude": 37.7749,
-                        "longitude": -122.4194,
-                        "altitude": 10.5
-                    },
-                },
-            ]
-        }
-        
-        with PhotoSyncClient(mock_config) as client:
-            with patch.object(client, 'check_health', return_value=True):
-                with patch.object(client, '_make_request') as mock_request:
-                    # Mock responses in order
-                    list_response = MagicMock()
-                    list_response.json.return_value = photos_response
-                    
-                    download1_response = MagicMock()
-                    download1_response.headers = {
-                        "X-Original-Filename": "IMG_1234.heic",
-                        "X-Media-Type": "image",
-                        "X-Creation-Date": "2024-01-15T10:30:00Z",
-                    }
-                    download1_response.content = b"fake heic data"
-                    
-                    download2_response = MagicMock()
-                    download2_response.headers = {
-                        "X-Original-Filename": "VID_5678.mov",
-                        "X-Media-Type": "video",
-                        "X-Creation-Date": "2024-01-16T14:20:00Z",
-                    }
-                    download2_response.content = b"fake video data"
-                    
-                    mock_request.side_effect = [
-                        list_response,
-                        download1_response,
-                        download2_response,
-                    ]
-                    
-                    downloaded = client.sync()
-                    
-                    assert downloaded == 2
-                    
-                    # Verify files were created
-                    files = list(mock_config.DOWNLOAD_DIR.iterdir())
-                    assert len(files) == 2
-                    
-                    # Verify state was saved
-                    assert mock_config.STATE_FILE.exists()
+        with patch.object(client, 'check_health', return_value=True):
+            with patch.object(client, '_make_request') as mock_request:
+                # Mock responses in order
+                mock_request.side_effect = iter((
+                    _LIST_RESP,
+                    _make_download_response(
+                        "IMG_1234.heic", b"fake heic data", "image",
+                        "2024-01-15T10:30:00Z",
+                    ),
+                    _make_download_response(
+                        "VID_5678.mov", b"fake video data", "video",
+                        "2024-01-16T14:20:00Z",
+                    ),
+                ))
+                
+                downloaded = client.sync()
+                
+                assert downloaded == 2
+                
+                # Verify files were created (ignoring the hidden download index)
+                files = [
+                    f for f in mock_config.DOWNLOAD_DIR.iterdir()
+                    if not f.name.startswith(".")
+                ]
+                assert len(files) == 2
+                
+                # Verify state was saved
+                assert mock_config.STATE_FILE.exists()
     
-    def test_incremental_sync_uses_last_timestamp(self, mock_config, temp_dir):
+    def test_incremental_sync_uses_last_timestamp(self, client, mock_config):
         """Verify incremental sync passes last sync time to server."""
         mock_config.DOWNLOAD_DIR.mkdir(parents=True, exist_ok=True)
         
@@ -154,46 +172,47 @@ class TestClientServerInteraction:
             "last_sync_timestamp": last_sync
         }))
         
-        with PhotoSyncClient(mock_config) as client:
-            with patch.object(client, 'check_health', return_value=True):
-                with patch.object(client, '_make_request') as mock_request:
-                    mock_response = MagicMock()
-                    mock_response.json.return_value = {"count": 0, "photos": []}
-                    mock_request.return_value = mock_response
-                    
-                    client.sync()
-                    
-                    # Verify the since parameter was included in the path
-                    call_args = mock_request.call_args_list[0]
-                    path = call_args[0][1]
-                    assert f"since={last_sync}" in path
+        with patch.object(client, 'check_health', return_value=True):
+            with patch.object(client, '_make_request') as mock_request:
+                mock_request.return_value = httpx.Response(
+                    200, json={"count": 0, "photos": []}
+                )
+                
+                client.sync()
+                
+                # Verify the since parameter was included in the path
+                call_args = mock_request.call_args_list[0]
+                path = call_args[0][1]
+                assert f"since={last_sync}" in path
     
-    def test_signature_uses_path_without_query_string(self, mock_config, temp_dir):
+    def test_signature_uses_path_without_query_string(self, client, mock_config):
         """Verify HMAC signature is computed on path only (not query string)."""
         mock_config.DOWNLOAD_DIR.mkdir(parents=True, exist_ok=True)
         
-        with PhotoSyncClient(mock_config) as client:
-            with patch('sync.generate_auth_headers') as mock_auth:
-                mock_auth.return_value = {"X-Timestamp": "123", "X-Signature": "abc"}
-                
-                # Mock the HTTP client to avoid actual requests
-                mock_http = MagicMock()
-                mock_response = MagicMock()
-                mock_response.json.return_value = {"count": 0, "photos": []}
-                mock_http.request.return_value = mock_response
-                client._client = mock_http
-                
-                # Call list_photos with since parameter
-                client.list_photos(since=1700000000)
-                
-                # Verify auth headers were generated with path only (no query string)
-                mock_auth.assert_called_once()
-                call_args = mock_auth.call_args[0]
-                assert call_args[1] == "/photos"  # Path without query string
+        with patch('sync.generate_auth_headers_b') as mock_auth:
+            mock_auth.return_value = {"X-Timestamp": "123", "X-Signature": "abc"}
+            
+            # Mock the HTTP client to avoid actual requests
+            mock_http = MagicMock()
+            mock_http.request.return_value = httpx.Response(
+                200,
+                json={"count": 0, "photos": []},
+                request=httpx.Request("GET", "http://localhost:8080/photos"),
+            )
+            client._client = mock_http
+            
+            # Call list_photos with since parameter
+            client.list_photos(since=1700000000)
+            
+            # Verify auth headers were generated with path only (no query string)
+            mock_auth.assert_called_once()
+            call_args = mock_auth.call_args[0]
+            assert call_args[1] == b"/photos"  # Path without query string
     
-    def test_live_photo_download_multipart(self, mock_config, temp_dir):
+    def test_live_photo_download_multipart(self, client, mock_config, live_photo_multipart):
         """Test downloading a Live Photo with multipart response."""
         mock_config.DOWNLOAD_DIR.mkdir(parents=True, exist_ok=True)
+        boundary, body = live_photo_multipart
         
         photo_metadata = {
             "id": "LIVE123/L0/001",
@@ -201,87 +220,62 @@ class TestClientServerInteraction:
             "mediaSubtypes": ["livePhoto"],
         }
         
-        # Create multipart response similar to server
-        boundary = "test-boundary-12345"
-        multipart_body = (
-            f"--{boundary}\r\n"
-            f'Content-Disposition: form-data; name="photo"; filename="IMG_LIVE.heic"\r\n'
-            f"Content-Type: image/heic\r\n\r\n"
-            f"fake heic data"
-            f"\r\n--{boundary}\r\n"
-            f'Content-Disposition: form-data; name="video"; filename="IMG_LIVE.mov"\r\n'
-            f"Content-Type: video/quicktime\r\n\r\n"
-            f"fake video data"
-            f"\r\n--{boundary}--\r\n"
-        ).encode()
-        
-        with PhotoSyncClient(mock_config) as client:
-            with patch.object(client, '_make_request') as mock_request:
-                mock_response = MagicMock()
-                mock_response.headers = {
+        with patch.object(client, '_make_request') as mock_request:
+            mock_request.return_value = httpx.Response(
+                200,
+                headers={
                     "content-type": f"multipart/form-data; boundary={boundary}",
                     "X-Creation-Date": "2024-01-15T10:30:00Z",
-                }
-                mock_response.content = multipart_body
-                mock_request.return_value = mock_response
-                
-                result = client.download_photo("LIVE123/L0/001", photo_metadata)
-                
-                assert result is not None
-                # Should have created files for both components
-                files = list(mock_config.DOWNLOAD_DIR.iterdir())
-                assert len(files) >= 1  # At least the photo
+                },
+                content=body,
+            )
+            
+            result = client.download_photo("LIVE123/L0/001", photo_metadata)
+            
+            assert result is not None
+            # Should have created files for both components
+            files = list(mock_config.DOWNLOAD_DIR.iterdir())
+            assert len(files) >= 1  # At least the photo
 
 
 class TestErrorHandling:
     """Tests for error handling in integration scenarios."""
     
-    @pytest.fixture
-    def temp_dir(self):
-        with tempfile.TemporaryDirectory() as tmpdir:
-            yield Path(tmpdir)
+    @pytest.fixture(scope="class")
+    def mock_config(self, tmp_path_factory):
+        temp_dir = tmp_path_factory.mktemp("errors", numbered=True)
+        return SimpleNamespace(
+            SERVER_URL="http://localhost:8080",
+            SHARED_SECRET="test-secret",
+            DOWNLOAD_DIR=temp_dir / "downloads",
+            STATE_FILE=temp_dir / ".sync_state",
+            REQUEST_TIMEOUT=30,
+            MAX_CONCURRENT_DOWNLOADS=2,
+            POLL_INTERVAL_HOURS=1,
+            ensure_directories=lambda: None,
+        )
     
-    @pytest.fixture
-    def mock_config(self, temp_dir):
-        config = MagicMock()
-        config.SERVER_URL = "http://localhost:8080"
-        config.SHARED_SECRET = "test-secret"
-        config.DOWNLOAD_DIR = temp_dir / "downloads"
-        config.STATE_FILE = temp_dir / ".sync_state"
-        config.REQUEST_TIMEOUT = 30
-        config.ensure_directories = MagicMock()
-        return config
-    
-    def test_handles_server_error_gracefully(self, mock_config, temp_dir):
-        """Client should handle server errors without crashing."""
+    @pytest.mark.parametrize("exc", [
+        httpx.HTTPStatusError(
+            "Server Error",
+            request=MagicMock(),
+            response=httpx.Response(500)
+        ),
+        httpx.TimeoutException("Timeout"),
+    ], ids=["server_error", "timeout"])
+    def test_handles_request_failure_gracefully(self, mock_config, exc):
+        """Client should survive server errors and network timeouts."""
         mock_config.DOWNLOAD_DIR.mkdir(parents=True, exist_ok=True)
         
         with PhotoSyncClient(mock_config) as client:
             with patch.object(client, 'check_health', return_value=True):
                 with patch.object(client, '_make_request') as mock_request:
-                    mock_request.side_effect = httpx.HTTPStatusError(
-                        "Server Error",
-                        request=MagicMock(),
-                        response=MagicMock(status_code=500)
-                    )
+                    mock_request.side_effect = exc
                     
                     # Should not raise
-                    downloaded = client.sync()
-                    assert downloaded == 0
+                    assert client.sync() == 0
     
-    def test_handles_network_timeout(self, mock_config, temp_dir):
-        """Client should handle network timeouts."""
-        mock_config.DOWNLOAD_DIR.mkdir(parents=True, exist_ok=True)
-        
-        with PhotoSyncClient(mock_config) as client:
-            with patch.object(client, 'check_health', return_value=True):
-                with patch.object(client, '_make_request') as mock_request:
-                    mock_request.side_effect = httpx.TimeoutException("Timeout")
-                    
-                    downloaded = client.sync()
-                    assert downloaded == 0
-    
-    def test_continues_after_single_download_failure(self, mock_config, temp_dir):
+    def test_continues_after_single_download_failure(self, mock_config):
         """Should continue downloading other photos if one fails."""
         mock_config.DOWNLOAD_DIR.mkdir(parents=True, exist_ok=True)
         
@@ -296,29 +290,25 @@ class TestErrorHandling:
         with PhotoSyncClient(mock_config) as client:
             with patch.object(client, 'check_health', return_value=True):
                 with patch.object(client, '_make_request') as mock_request:
-                    list_response = MagicMock()
-                    list_response.json.return_value = photos_response
+                    list_response = httpx.Response(200, json=photos_response)
                     
                     # First download fails
                     download1_error = httpx.HTTPStatusError(
                         "Not Found",
                         request=MagicMock(),
-                        response=MagicMock(status_code=404)
+                        response=httpx.Response(404)
                     )
                     
                     # Second download succeeds
-                    download2_response = MagicMock()
-                    download2_response.headers = {
-                        "X-Original-Filename": "IMG_2.jpg",
-                        "X-Media-Type": "image",
-                    }
-                    download2_response.content = b"photo data"
+                    download2_response = _make_download_response(
+                        "IMG_2.jpg", b"photo data", "image"
+                    )
                     
-                    mock_request.side_effect = [
+                    mock_request.side_effect = iter((
                         list_response,
                         download1_error,
                         download2_response,
-                    ]
+                    ))
                     
                     downloaded = client.sync()
                     
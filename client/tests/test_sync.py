@@ -1,9 +1,9 @@
 """Unit tests for the sync module."""
 
 import json
-import tempfile
+import os
 from datetime import datetime
-from pathlib import Path
+from types import MappingProxyType, SimpleNamespace
 from unittest.mock import MagicMock, patch
 
 import httpx
@@ -12,27 +12,86 @@ import pytest
 from sync import PhotoSyncClient
 
 
+# Read-only payloads shared by the tests below
+_PHOTO_METADATA = MappingProxyType({
+    "id": "photo1",
+    "creationDate": "2024-01-15T10:30:00Z",
+    "mediaType": "image",
+    "mediaSubtypes": (),
+})
+_LIST_PHOTOS_RESPONSE = MappingProxyType({
+    "count": 2,
+    "photos": (
+        _PHOTO_METADATA,
+        MappingProxyType({
+            "id": "photo2",
+            "creationDate": "2024-01-16T10:30:00Z",
+            "mediaType": "video",
+            "mediaSubtypes": (),
+        }),
+    ),
+})
+_SINGLE_PHOTO_RESPONSE = MappingProxyType({"count": 1, "photos": (_PHOTO_METADATA,)})
+_EMPTY_LIST_RESPONSE = MappingProxyType({"count": 0, "photos": ()})
+_PHOTO_CONTENT = b"fake image data"
+_NEW_PHOTO_CONTENT = b"new photo"
+
+
+@pytest.fixture(scope="session")
+def _base_config():
+    """Settings shared by every test; copied before per-test paths are added."""
+    return SimpleNamespace(
+        SERVER_URL="http://localhost:8080",
+        SHARED_SECRET="test-secret",
+        REQUEST_TIMEOUT=30,
+        MAX_CONCURRENT_DOWNLOADS=2,
+        POLL_INTERVAL_HOURS=1,
+    )
+
+
+@pytest.fixture
+def mock_config(_base_config, tmp_path):
+    """Create a mock config for testing."""
+    return SimpleNamespace(
+        **vars(_base_config),
+        DOWNLOAD_DIR=tmp_path / "downloads",
+        STATE_FILE=tmp_path / ".sync_state",
+        # A mock so tests can check PhotoSyncClient calls it
+        ensure_directories=MagicMock(),
+    )
+
+
+def _mk(json_data=None, content=None, headers=None):
+    """Build a mocked HTTP response once."""
+    response = MagicMock(status_code=200, headers=headers or {})
+    if json_data is not None:
+        response.json.return_value = json_data
+    if content is not None:
+        response.iter_bytes.return_value = [content]
+    return response
+
+
+@pytest.fixture(scope="session")
+def mock_responses():
+    """Prebuilt responses for tests that never inspect calls on them, keyed by scenario."""
+    return {
+        "list_2": _mk(json_data=_LIST_PHOTOS_RESPONSE),
+        "list_1": _mk(json_data=_SINGLE_PHOTO_RESPONSE),
+        "list_empty": _mk(json_data=_EMPTY_LIST_RESPONSE),
+        "download_img": _mk(content=_PHOTO_CONTENT, headers={
+            "X-Original-Filename": "IMG_1234.jpg",
+            "X-Media-Type": "image",
+        }),
+        "download_new": _mk(content=_NEW_PHOTO_CONTENT, headers={
+            "X-Original-Filename": "IMG_1234.jpg",
+            "X-Media-Type": "image",
+        }),
+    }
+
+
 class TestPhotoSyncClient:
     """Tests for PhotoSyncClient class."""
     
-    @pytest.fixture
-    def temp_dir(self):
-        """Create a temporary directory for tests."""
-        with tempfile.TemporaryDirectory() as tmpdir:
-            yield Path(tmpdir)
-    
-    @pytest.fixture
-    def mock_config(self, temp_dir):
-        """Create a mock config for testing."""
-        config = MagicMock()
-        config.SERVER_URL = "http://localhost:8080"
-        config.SHARED_SECRET = "test-secret"
-        config.DOWNLOAD_DIR = temp_dir / "downloads"
-        config.STATE_FILE = temp_dir / ".sync_state"
-        config.REQUEST_TIMEOUT = 30
-        config.ensure_directories = MagicMock()
-        return config
-    
     @pytest.fixture
     def client(self, mock_config):
         """Create a PhotoSyncClient with mock config."""
@@ -53,6 +112,21 @@ class TestPhotoSyncClient:
         with PhotoSyncClient(mock_config) as client:
             assert client is not None
     
+    def test_http_client_survives_poll_interval(self, client):
+        """Should keep the same HTTP client across a full poll interval of idleness."""
+        http_client = client.client
+        with patch("sync.time.monotonic", return_value=client._last_used + 3600.05):
+            assert client.client is http_client
+    
+    def test_connection_pool_fits_download_workers(self, mock_config):
+        """Should allow at least one pooled connection per download worker."""
+        mock_config.MAX_CONCURRENT_DOWNLOADS = 32
+        with PhotoSyncClient(mock_config) as client, \
+                patch("sync.httpx.Limits", wraps=httpx.Limits) as limits:
+            client.client
+        
+        assert limits.call_args.kwargs["max_connections"] == 32
+    
     # MARK: - State Management Tests
     
     def test_get_last_sync_time_no_file(self, client, mock_config):
@@ -82,6 +156,21 @@ class TestPhotoSyncClient:
         state = json.loads(mock_config.STATE_FILE.read_text())
         assert state["last_sync_timestamp"] == 1700000000
     
+    def test_save_sync_time_without_directory_fsync(self, client, mock_config, monkeypatch):
+        """Should still save when the directory cannot be opened for fsync."""
+        mock_config.STATE_FILE.parent.mkdir(parents=True, exist_ok=True)
+        real_open = os.open
+        
+        def no_directories(path, flags, *args):
+            if os.path.isdir(path):
+                raise PermissionError("cannot open a directory")
+            return real_open(path, flags, *args)
+        
+        monkeypatch.setattr("sync.os.open", no_directories)
+        client.save_sync_time(1700000000)
+        
+        assert client.get_last_sync_time() == 1700000000
+    
     # MARK: - Filename Sanitization Tests
     
     def test_sanitize_filename_removes_invalid_chars(self, client):
@@ -139,105 +228,70 @@ class TestPhotoSyncClient:
 class TestPhotoSyncClientIntegration:
     """Integration tests for PhotoSyncClient with mocked HTTP."""
     
-    @pytest.fixture
-    def temp_dir(self):
-        """Create a temporary directory for tests."""
-        with tempfile.TemporaryDirectory() as tmpdir:
-            yield Path(tmpdir)
-    
-    @pytest.fixture
-    def mock_config(self, temp_dir):
-        """Create a mock config for testing."""
-        config = MagicMock()
-        config.SERVER_URL = "http://localhost:8080"
-        config.SHARED_SECRET = "test-secret"
-        config.DOWNLOAD_DIR = temp_dir / "downloads"
-        config.STATE_FILE = temp_dir / ".sync_state"
-        config.REQUEST_TIMEOUT = 30
-        config.ensure_directories = MagicMock()
-        return config
-    
-    def test_list_photos_parses_response(self, mock_config, temp_dir):
+    def test_list_photos_parses_response(self, mock_config, mock_responses, monkeypatch):
         """Should parse photo list response correctly."""
         mock_config.DOWNLOAD_DIR.mkdir(parents=True, exist_ok=True)
         
-        mock_response_data = {
-            "count": 2,
-            "photos": [
-                {
-                    "id": "photo1",
-                    "creationDate": "2024-01-15T10:30:00Z",
-                    "mediaType": "image",
-                    "mediaSubtypes": [],
-                },
-                {
-                    "id": "photo2",
-                    "creationDate": "2024-01-16T10:30:00Z",
-                    "mediaType": "video",
-                    "mediaSubtypes": [],
-                },
-            ]
-        }
-        
         with PhotoSyncClient(mock_config) as client:
-            with patch.object(client, '_make_request') as mock_request:
-                mock_response = MagicMock()
-                mock_response.json.return_value = mock_response_data
-                mock_request.return_value = mock_response
-                
-                photos = client.list_photos()
-                
-                assert len(photos) == 2
-                assert photos[0]["id"] == "photo1"
-                assert photos[1]["id"] == "photo2"
+            response = mock_responses["list_2"]
+            monkeypatch.setattr(client, "_make_request", lambda *args, **kwargs: response)
+            
+            photos = client.list_photos()
+            
+            assert len(photos) == 2
+            assert photos[0]["id"] == "photo1"
+            assert photos[1]["id"] == "photo2"
     
-    def test_list_photos_with_since_parameter(self, mock_config, temp_dir):
+    def test_list_photos_with_since_parameter(self, mock_config, mock_responses, monkeypatch):
         """Should include since parameter in request path."""
         mock_config.DOWNLOAD_DIR.mkdir(parents=True, exist_ok=True)
         
         with PhotoSyncClient(mock_config) as client:
-            with patch.object(client, '_make_request') as mock_request:
-                mock_response = MagicMock()
-                mock_response.json.return_value = {"count": 0, "photos": []}
-                mock_request.return_value = mock_response
-                
-                client.list_photos(since=1700000000)
-                
-                mock_request.assert_called_once()
-                call_args = mock_request.call_args
-                # Full path with query string is passed to _make_request
-                assert "since=1700000000" in call_args[0][1]
-                # But signature should only use path portion (handled inside _make_request)
+            mock_request = MagicMock(return_value=mock_responses["list_empty"])
+            monkeypatch.setattr(client, "_make_request", mock_request)
+            
+            client.list_photos(since=1700000000)
+            
+            mock_request.assert_called_once()
+            call_args = mock_request.call_args
+            # Full path with query string is passed to _make_request
+            assert "since=1700000000" in call_args[0][1]
+            # But signature should only use path portion (handled inside _make_request)
     
-    def test_download_photo_saves_file(self, mock_config, temp_dir):
-        """Should save downloaded photo to disk."""
+    def test_list_photos_revalidates_empty_listing_with_etag(self, mock_config, monkeypatch):
+        """Should send the stored ETag and treat 304 Not Modified as no new photos."""
         mock_config.DOWNLOAD_DIR.mkdir(parents=True, exist_ok=True)
         
-        photo_content = b"fake image data"
-        photo_metadata = {
-            "id": "photo1",
-            "creationDate": "2024-01-15T10:30:00Z",
-            "mediaType": "image",
-            "mediaSubtypes": [],
-        }
+        with PhotoSyncClient(mock_config) as client:
+            empty_response = MagicMock(status_code=200, headers={"ETag": '"abc"'})
+            empty_response.json.return_value = {"count": 0, "photos": []}
+            not_modified = MagicMock(status_code=304)
+            mock_request = MagicMock(side_effect=[empty_response, not_modified])
+            monkeypatch.setattr(client, "_make_request", mock_request)
+            
+            assert client.list_photos() == []
+            assert client.list_photos() == []
+            
+            second_call = mock_request.call_args_list[1]
+            assert second_call.kwargs["headers"] == {"If-None-Match": '"abc"'}
+            not_modified.json.assert_not_called()
+    
+    def test_download_photo_saves_file(self, mock_config, mock_responses, monkeypatch):
+        """Should save downloaded photo to disk."""
+        mock_config.DOWNLOAD_DIR.mkdir(parents=True, exist_ok=True)
         
         with PhotoSyncClient(mock_config) as client:
-            with patch.object(client, '_make_request') as mock_request:
-                mock_response = MagicMock()
-                mock_response.headers = {
-                    "X-Original-Filename": "IMG_1234.jpg",
-                    "X-Media-Type": "image",
-                }
-                mock_response.content = photo_content
-                mock_request.return_value = mock_response
-                
-                result = client.download_photo("photo1", photo_metadata)
-                
-                assert result is not None
-                assert result.exists()
-                assert result.read_bytes() == photo_content
+            response = mock_responses["download_img"]
+            monkeypatch.setattr(client, "_make_request", lambda *args, **kwargs: response)
+            
+            result = client.download_photo("photo1", _PHOTO_METADATA)
+            
+            assert result is not None
+            output_path, size = result
+            assert output_path.read_bytes() == _PHOTO_CONTENT
+            assert size == len(_PHOTO_CONTENT)
     
-    def test_download_photo_handles_duplicate_filenames(self, mock_config, temp_dir):
+    def test_download_photo_handles_duplicate_filenames(self, mock_config, mock_responses, monkeypatch):
         """Should handle duplicate filenames by adding suffix."""
         mock_config.DOWNLOAD_DIR.mkdir(parents=True, exist_ok=True)
         
@@ -252,65 +306,129 @@ class TestPhotoSyncClientIntegration:
         }
         
         with PhotoSyncClient(mock_config) as client:
-            with patch.object(client, '_make_request') as mock_request:
-                mock_response = MagicMock()
-                mock_response.headers = {
-                    "X-Original-Filename": "IMG_1234.jpg",
-                    "X-Media-Type": "image",
-                }
-                mock_response.content = b"new photo"
-                mock_request.return_value = mock_response
-                
-                result = client.download_photo("photo1", photo_metadata)
-                
-                assert result is not None
-                assert result.name == "IMG_1234_1.jpg"
-                assert existing_file.exists()  # Original unchanged
+            response = mock_responses["download_new"]
+            monkeypatch.setattr(client, "_make_request", lambda *args, **kwargs: response)
+            
+            result = client.download_photo("photo1", photo_metadata)
+            
+            assert result is not None
+            assert result[0].name == "IMG_1234_1.jpg"
+            assert existing_file.exists()  # Original unchanged
+    
+    def test_download_photo_skips_identical_existing_file(self, mock_config, monkeypatch):
+        """Should not read the body when a same-sized copy is already on disk."""
+        mock_config.DOWNLOAD_DIR.mkdir(parents=True, exist_ok=True)
+        existing_file = mock_config.DOWNLOAD_DIR / "IMG_1234.jpg"
+        existing_file.write_bytes(b"same data")
+        
+        with PhotoSyncClient(mock_config) as client:
+            mock_response = MagicMock()
+            mock_response.headers = {
+                "X-Original-Filename": "IMG_1234.jpg",
+                "Content-Length": str(len(b"same data")),
+            }
+            monkeypatch.setattr(client, "_make_request", lambda *args, **kwargs: mock_response)
+            
+            result = client.download_photo("photo1", {"id": "photo1"})
+            
+            assert result == "skipped"
+            mock_response.iter_bytes.assert_not_called()
+            assert list(mock_config.DOWNLOAD_DIR.glob("IMG_1234*")) == [existing_file]
     
-    def test_sync_downloads_new_photos(self, mock_config, temp_dir):
+    def test_download_photo_removes_partial_file_on_stream_error(self, mock_config, monkeypatch):
+        """Should not leave a truncated file behind if the stream fails mid-download."""
+        mock_config.DOWNLOAD_DIR.mkdir(parents=True, exist_ok=True)
+        
+        def broken_stream(chunk_size):
+            yield b"partial"
+            raise httpx.ReadError("Connection reset")
+        
+        with PhotoSyncClient(mock_config) as client:
+            mock_response = MagicMock()
+            mock_response.headers = {
+                "X-Original-Filename": "IMG_1234.jpg",
+                "X-Media-Type": "image",
+            }
+            mock_response.iter_bytes.side_effect = broken_stream
+            monkeypatch.setattr(client, "_make_request", lambda *args, **kwargs: mock_response)
+            
+            result = client.download_photo("photo1", {"id": "photo1"})
+            
+            assert result is None
+            assert not (mock_config.DOWNLOAD_DIR / "IMG_1234.jpg").exists()
+            mock_response.close.assert_called_once()
+    
+    def test_download_live_photo_streams_each_component(
+        self, mock_config, monkeypatch, live_photo_multipart
+    ):
+        """Should write each multipart component to its own file as it streams in."""
+        mock_config.DOWNLOAD_DIR.mkdir(parents=True, exist_ok=True)
+        boundary, body = live_photo_multipart
+        
+        with PhotoSyncClient(mock_config) as client:
+            mock_response = MagicMock()
+            mock_response.headers = {
+                "content-type": f"multipart/form-data; boundary={boundary}",
+            }
+            # Deliver the body in small chunks that straddle part boundaries
+            mock_response.iter_bytes.return_value = [
+                body[i:i + 7] for i in range(0, len(body), 7)
+            ]
+            monkeypatch.setattr(client, "_make_request", lambda *args, **kwargs: mock_response)
+            
+            path, size = client._download_live_photo("LIVE1", {"id": "LIVE1"})
+            
+            assert path == mock_config.DOWNLOAD_DIR / "IMG_LIVE.heic"
+            assert path.read_bytes() == b"fake heic data"
+            assert size == len(b"fake heic data") + len(b"fake video data")
+            video = mock_config.DOWNLOAD_DIR / "IMG_LIVE.mov"
+            assert video.read_bytes() == b"fake video data"
+    
+    def test_sync_downloads_new_photos(self, mock_config, mock_responses, monkeypatch):
         """Full sync should download new photos and update state."""
         mock_config.DOWNLOAD_DIR.mkdir(parents=True, exist_ok=True)
         
-        photos_response = {
-            "count": 1,
-            "photos": [{
-                "id": "photo1",
-                "creationDate": "2024-01-15T10:30:00Z",
-                "mediaType": "image",
-                "mediaSubtypes": [],
-            }]
-        }
+        with PhotoSyncClient(mock_config) as client:
+            monkeypatch.setattr(client, "check_health", lambda: True)
+            # First call: list photos; second call: download photo
+            responses = iter((
+                mock_responses["list_1"],
+                mock_responses["download_img"],
+            ))
+            monkeypatch.setattr(client, "_make_request", lambda *args, **kwargs: next(responses))
+            
+            downloaded = client.sync()
+            
+            assert downloaded == 1
+            # State file should be updated
+            assert mock_config.STATE_FILE.exists()
+    
+    def test_sync_avoids_names_present_in_download_dir(self, mock_config, mock_responses, monkeypatch):
+        """Sync should suffix names already present in the directory snapshot."""
+        mock_config.DOWNLOAD_DIR.mkdir(parents=True, exist_ok=True)
+        existing_file = mock_config.DOWNLOAD_DIR / "IMG_1234.jpg"
+        existing_file.write_bytes(b"existing")
         
         with PhotoSyncClient(mock_config) as client:
-            with patch.object(client, 'check_health', return_value=True):
-                with patch.object(client, '_make_request') as mock_request:
-                    # First call: list photos
-                    list_response = MagicMock()
-                    list_response.json.return_value = photos_response
-                    
-                    # Second call: download photo
-                    download_response = MagicMock()
-                    download_response.headers = {
-                        "X-Original-Filename": "IMG_1234.jpg",
-                        "X-Media-Type": "image",
-                    }
-                    download_response.content = b"photo data"
-                    
-                    mock_request.side_effect = [list_response, download_response]
-                    
-                    downloaded = client.sync()
-                    
-                    assert downloaded == 1
-                    # State file should be updated
-                    assert mock_config.STATE_FILE.exists()
+            responses = iter((
+                mock_responses["list_1"],
+                mock_responses["download_new"],
+            ))
+            monkeypatch.setattr(client, "_make_request", lambda *args, **kwargs: next(responses))
+            
+            assert client.sync() == 1
+            
+            assert existing_file.read_bytes() == b"existing"
+            assert (mock_config.DOWNLOAD_DIR / "IMG_1234_1.jpg").read_bytes() == _NEW_PHOTO_CONTENT
+            assert client._existing is None
     
-    def test_sync_skips_when_server_unhealthy(self, mock_config, temp_dir):
+    def test_sync_skips_when_server_unhealthy(self, mock_config, monkeypatch):
         """Sync should skip if server health check fails."""
         mock_config.DOWNLOAD_DIR.mkdir(parents=True, exist_ok=True)
         
         with PhotoSyncClient(mock_config) as client:
-            with patch.object(client, 'check_health', return_value=False):
-                downloaded = client.sync()
-                
-                assert downloaded == 0
+            monkeypatch.setattr(client, "check_health", lambda: False)
+            downloaded = client.sync()
+            
+            assert downloaded == 0
 
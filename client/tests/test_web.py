@@ -0,0 +1,225 @@
+"""Unit tests for the web app."""
+
+import asyncio
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import httpx
+import pytest
+
+from web import app as web_app
+from web.app import _parse_iso_z
+
+
+class _StubSyncClient:
+    """Stands in for PhotoSyncClient; downloads just sleep and record the photo id."""
+    
+    def __init__(self, delay: float = 0.05):
+        self.delay = delay
+        self.prefix = "A"
+        self.photo_count = 6
+        self.downloaded: list[str] = []
+        self.saves = 0
+        self.closed = False
+        # Cleared to hold every download until a test releases them
+        self.release = threading.Event()
+        self.release.set()
+    
+    def check_health(self) -> bool:
+        return True
+    
+    def get_last_sync_time(self):
+        return None
+    
+    def list_photos(self, since=None) -> list:
+        return [{"id": f"{self.prefix}{i}"} for i in range(self.photo_count)]
+    
+    def download_photo(self, photo_id: str, photo_metadata: dict):
+        self.release.wait(5)
+        time.sleep(self.delay)
+        self.downloaded.append(photo_id)
+        return Path(f"{photo_id}.jpg"), 10
+    
+    def save_sync_time(self, timestamp: float) -> None:
+        self.saves += 1
+    
+    def close(self) -> None:
+        self.closed = True
+
+
+@pytest.fixture
+def stub_client():
+    """A fresh stub sync client for each test."""
+    return _StubSyncClient()
+
+
+@pytest.fixture
+def messages(monkeypatch, tmp_path, stub_client):
+    """Broadcast messages of a web app with fresh sync state and a stubbed sync client."""
+    sent = []
+    
+    async def broadcast(message: dict):
+        sent.append(message)
+    
+    monkeypatch.setattr(web_app, "sync_state", web_app.SyncState())
+    monkeypatch.setattr(web_app.manager, "broadcast", broadcast)
+    monkeypatch.setattr(web_app, "_get_client", lambda: stub_client)
+    monkeypatch.setattr(web_app.Config, "MAX_CONCURRENT_DOWNLOADS", 2)
+    return sent
+
+
+def _api() -> httpx.AsyncClient:
+    """An HTTP client that calls the web app in-process."""
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=web_app.app), base_url="http://test")
+
+
+async def _wait_for(predicate, timeout: float = 5) -> None:
+    """Yield to the event loop until ``predicate()`` holds."""
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "timed out waiting for the sync"
+        await asyncio.sleep(0.01)
+
+
+def _count(messages: list, message_type: str) -> int:
+    """Number of broadcast messages of ``message_type``."""
+    return sum(message["type"] == message_type for message in messages)
+
+
+class TestParseIsoZ:
+    """Tests for the _parse_iso_z function."""
+    
+    @pytest.mark.parametrize("value", [
+        "2024-01-15T10:30:00Z",
+        "2024-01-15T10:30:00+00:00",
+        "2024-01-15T10:30:00.123456Z",
+    ])
+    def test_matches_fromisoformat(self, value):
+        """Should parse the same instant as datetime.fromisoformat."""
+        expected = datetime.fromisoformat(value.replace("Z", "+00:00"))
+        assert _parse_iso_z(value) == expected
+    
+    def test_fast_path_is_utc(self):
+        """Should return an aware UTC datetime for the server's format."""
+        assert _parse_iso_z("2024-01-15T10:30:00Z") == datetime(2024, 1, 15, 10, 30, tzinfo=timezone.utc)
+    
+    @pytest.mark.parametrize("value", [
+        "2024x01x15T10:30:00Z",
+        "2024-+1-15T10:30:00Z",
+        "2024-01-15T10 30:00Z",
+        "2024- 1-15T10:30:00Z",
+        "2024-13-15T10:30:00Z",
+        "not a date",
+    ])
+    def test_rejects_malformed(self, value):
+        """Should raise ValueError for anything fromisoformat rejects."""
+        with pytest.raises(ValueError):
+            _parse_iso_z(value)
+
+
+class TestSyncCancellation:
+    """Tests for cancelling a web sync."""
+    
+    @pytest.mark.asyncio
+    async def test_cancel_then_restart_does_not_overlap(self, messages, stub_client):
+        """A new sync should start only after the cancelled one has drained."""
+        async with _api() as api:
+            assert (await api.post("/api/sync")).status_code == 200
+            await _wait_for(lambda: stub_client.downloaded)
+            
+            assert (await api.post("/api/sync/cancel")).json() == {"status": "cancelled"}
+            # Downloads already in flight keep the cancelled run alive
+            assert web_app.sync_state.is_syncing
+            assert (await api.post("/api/sync")).status_code == 400
+            
+            await _wait_for(lambda: _count(messages, "sync_complete") == 1)
+            cancelled_run = list(stub_client.downloaded)
+            
+            stub_client.prefix = "B"
+            assert (await api.post("/api/sync")).status_code == 200
+            await _wait_for(lambda: _count(messages, "sync_complete") == 2)
+        
+        # The cancelled run started nothing new, and the runs never interleaved
+        assert len(cancelled_run) < stub_client.photo_count
+        restarted_run = stub_client.downloaded[len(cancelled_run):]
+        assert stub_client.downloaded[:len(cancelled_run)] == cancelled_run
+        assert sorted(restarted_run) == [f"B{i}" for i in range(6)]
+        assert stub_client.saves == 2
+        assert not web_app.sync_state.is_syncing
+
+
+class TestProgressBatching:
+    """Tests for progress_batch broadcasts during a web sync."""
+    
+    @pytest.mark.asyncio
+    async def test_batches_hold_every_event_in_order(self, messages, stub_client):
+        """Should send each photo's events, in order, in batches of bounded size."""
+        stub_client.photo_count = 40
+        stub_client.delay = 0
+        
+        await web_app._run_sync()
+        
+        batches = [m["events"] for m in messages if m["type"] == "progress_batch"]
+        events = [event for batch in batches for event in batch]
+        assert len(batches) < len(events)
+        assert all(len(batch) <= web_app.PROGRESS_BATCH_SIZE for batch in batches)
+        assert _count(events, "downloading") == _count(events, "downloaded") == 40
+        # Each photo is announced before it is reported done
+        positions = {
+            (event["type"], event.get("photo_id") or Path(event["filename"]).stem): position
+            for position, event in enumerate(events)
+        }
+        for i in range(40):
+            assert positions[("downloading", f"A{i}")] < positions[("downloaded", f"A{i}")]
+    
+    @pytest.mark.asyncio
+    async def test_announces_download_before_it_finishes(self, messages, stub_client):
+        """Should broadcast "downloading" while the download is still in flight."""
+        stub_client.photo_count = 1
+        stub_client.release.clear()
+        sync = asyncio.create_task(web_app._run_sync())
+        try:
+            await _wait_for(lambda: any(
+                event["type"] == "downloading"
+                for m in messages if m["type"] == "progress_batch"
+                for event in m["events"]
+            ), timeout=1)
+            assert stub_client.downloaded == []
+        finally:
+            stub_client.release.set()
+            await sync
+        
+        assert _count(messages, "sync_complete") == 1
+
+
+class TestClientCache:
+    """Tests for the shared sync clients."""
+    
+    @pytest.mark.asyncio
+    async def test_server_change_keeps_running_sync_client_open(
+        self, messages, stub_client, monkeypatch
+    ):
+        """Should close a retired client only after the sync using it finishes."""
+        monkeypatch.setattr(web_app.Config, "SERVER_URL", "http://old:8080")
+        monkeypatch.setattr(web_app, "_client_cache", {})
+        monkeypatch.setattr(web_app, "_get_client", lambda: web_app._client_cache.setdefault(
+            (web_app.Config.SERVER_URL, web_app.Config.SHARED_SECRET), stub_client
+        ))
+        stub_client.photo_count = 1
+        stub_client.release.clear()
+        
+        async with _api() as api:
+            assert (await api.post("/api/sync")).status_code == 200
+            await _wait_for(lambda: web_app.sync_state.total_photos)
+            await api.post("/api/config", json={"server_url": "http://new:8080"})
+            
+            assert web_app._client_cache == {}
+            assert not stub_client.closed
+            
+            stub_client.release.set()
+            await _wait_for(lambda: _count(messages, "sync_complete") == 1)
+        
+        assert stub_client.downloaded == ["A0"]
+        assert stub_client.closed
@@ -3,13 +3,15 @@ PhotoShare Web Client - FastAPI backend with WebSocket for real-time updates.
 """
 
 import asyncio
-import json
+import atexit
 import os
 import sys
-from datetime import datetime
+import time
+from datetime import datetime, timedelta, timezone
 from pathlib import Path
 from typing import Optional
 
+import orjson
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect, Request
 from fastapi.responses import HTMLResponse, JSONResponse
 from fastapi.staticfiles import StaticFiles
@@ -32,28 +34,79 @@ static_dir = Path(__file__).parent / "static"
 if static_dir.exists():
     app.mount("/static", StaticFiles(directory=str(static_dir)), name="static")
 
+def _encode(message: dict) -> str:
+    """Serialize a WebSocket message to the JSON text the web UI parses."""
+    return orjson.dumps(message).decode()
+
+
+# Heartbeats never change, so they are serialized once
+_HEARTBEAT = _encode({"type": "heartbeat"})
+
 # WebSocket connection manager
 class ConnectionManager:
     def __init__(self):
-        self.active_connections: list[WebSocket] = []
+        self.active_connections: set[WebSocket] = set()
     
     async def connect(self, websocket: WebSocket):
         await websocket.accept()
-        self.active_connections.append(websocket)
+        self.active_connections.add(websocket)
     
     def disconnect(self, websocket: WebSocket):
-        if websocket in self.active_connections:
-            self.active_connections.remove(websocket)
+        self.active_connections.discard(websocket)
     
     async def broadcast(self, message: dict):
-        for connection in self.active_connections:
-            try:
-                await connection.send_json(message)
-            except:
-                pass
+        # Serialize once and send to every client concurrently
+        payload = _encode(message)
+        # Snapshot, since clients may connect or drop while sends are pending
+        connections = list(self.active_connections)
+        results = await asyncio.gather(
+            *(connection.send_text(payload) for connection in connections),
+            return_exceptions=True,
+        )
+        # Drop clients whose send failed; they have gone away
+        for connection, result in zip(connections, results):
+            if isinstance(result, Exception):
+                self.disconnect(connection)
 
 manager = ConnectionManager()
 
+# Per-photo events are sent in batches, at most this often or this large
+PROGRESS_BATCH_INTERVAL = 0.1
+PROGRESS_BATCH_SIZE = 16
+
+# Sync clients shared across requests so their connection pools stay warm,
+# keyed on the settings baked into each client
+_client_cache: dict[tuple, PhotoSyncClient] = {}
+# Clients a running sync holds, which must outlive a settings change
+_clients_in_use: set[PhotoSyncClient] = set()
+
+
+def _get_client() -> PhotoSyncClient:
+    """Return the shared sync client for the current server settings."""
+    key = (Config.SERVER_URL, Config.SHARED_SECRET)
+    client = _client_cache.get(key)
+    if client is None:
+        client = _client_cache[key] = PhotoSyncClient()
+    return client
+
+
+def _retire_clients():
+    """Forget every cached sync client, closing those no sync is still using."""
+    while _client_cache:
+        _, client = _client_cache.popitem()
+        if client not in _clients_in_use:
+            client.close()
+
+
+def _close_clients():
+    """Close and forget every cached sync client."""
+    while _client_cache:
+        _, client = _client_cache.popitem()
+        client.close()
+
+
+atexit.register(_close_clients)
+
 # Sync state
 class SyncState:
     def __init__(self):
@@ -67,6 +120,11 @@ class SyncState:
         self.start_time: Optional[datetime] = None
         self.last_sync_time: Optional[datetime] = None
         self.error_message: Optional[str] = None
+        # Set by /api/sync/cancel; a fresh event per run, so cancelling one
+        # run can never leak into the next
+        self.cancel_event: Optional[asyncio.Event] = None
+        # Last (bytes_downloaded, human-readable) pair served by /api/status
+        self._bytes_cache = (0, "0.0 B")
 
 sync_state = SyncState()
 
@@ -111,6 +169,9 @@ async def update_config(request: Request):
     
     if "server_url" in data:
         Config.SERVER_URL = data["server_url"]
+        # Clients built for the old server would keep using it; a running
+        # sync finishes on its own client, which it closes when done
+        _retire_clients()
     
     return {"status": "ok", "config": await get_config()}
 
@@ -119,20 +180,7 @@ async def update_config(request: Request):
 async def get_stats():
     """Get sync statistics."""
     download_dir = Config.DOWNLOAD_DIR
-    
-    # Count files in download directory
-    file_count = 0
-    total_size = 0
-    file_types = {}
-    
-    if download_dir.exists():
-        for f in download_dir.iterdir():
-            if f.is_file():
-                file_count += 1
-                size = f.stat().st_size
-                total_size += size
-                ext = f.suffix.lower()
-                file_types[ext] = file_types.get(ext, 0) + 1
+    file_count, total_size, file_types = _scan_download_dir(download_dir)
     
     return {
         "file_count": file_count,
@@ -148,6 +196,12 @@ async def get_stats():
 @app.get("/api/status")
 async def get_status():
     """Get current sync status."""
+    if sync_state._bytes_cache[0] == sync_state.bytes_downloaded:
+        bytes_human = sync_state._bytes_cache[1]
+    else:
+        bytes_human = _format_bytes(sync_state.bytes_downloaded)
+        sync_state._bytes_cache = (sync_state.bytes_downloaded, bytes_human)
+    
     return {
         "is_syncing": sync_state.is_syncing,
         "current_photo": sync_state.current_photo,
@@ -156,7 +210,7 @@ async def get_status():
         "downloaded_count": sync_state.downloaded_count,
         "failed_count": sync_state.failed_count,
         "bytes_downloaded": sync_state.bytes_downloaded,
-        "bytes_downloaded_human": _format_bytes(sync_state.bytes_downloaded),
+        "bytes_downloaded_human": bytes_human,
         "progress_percent": (sync_state.current_photo / sync_state.total_photos * 100) if sync_state.total_photos > 0 else 0,
         "error_message": sync_state.error_message,
     }
@@ -178,8 +232,7 @@ async def start_sync(request: Request):
     since_timestamp = None
     if since_date:
         try:
-            dt = datetime.fromisoformat(since_date.replace("Z", "+00:00"))
-            since_timestamp = dt.timestamp()
+            since_timestamp = _parse_iso_z(since_date).timestamp()
         except ValueError:
             return JSONResponse(
                 {"error": "Invalid date format"},
@@ -198,7 +251,8 @@ async def cancel_sync():
     if not sync_state.is_syncing:
         return {"status": "not_running"}
     
-    sync_state.is_syncing = False
+    # The run stays marked as syncing until its in-flight downloads finish
+    sync_state.cancel_event.set()
     await manager.broadcast({
         "type": "sync_cancelled",
         "message": "Sync cancelled by user"
@@ -211,12 +265,11 @@ async def cancel_sync():
 async def health_check():
     """Check if server is reachable."""
     try:
-        with PhotoSyncClient() as client:
-            is_healthy = client.check_health()
-            return {
-                "server_healthy": is_healthy,
-                "server_url": Config.SERVER_URL
-            }
+        is_healthy = _get_client().check_health()
+        return {
+            "server_healthy": is_healthy,
+            "server_url": Config.SERVER_URL
+        }
     except Exception as e:
         return {
             "server_healthy": False,
@@ -288,10 +341,10 @@ async def websocket_endpoint(websocket: WebSocket):
     await manager.connect(websocket)
     try:
         # Send initial status
-        await websocket.send_json({
+        await websocket.send_text(_encode({
             "type": "status",
             "data": await get_status()
-        })
+        }))
         
         # Keep connection alive and handle incoming messages
         while True:
@@ -302,7 +355,7 @@ async def websocket_endpoint(websocket: WebSocket):
                     await websocket.send_text("pong")
             except asyncio.TimeoutError:
                 # Send heartbeat
-                await websocket.send_json({"type": "heartbeat"})
+                await websocket.send_text(_HEARTBEAT)
     except WebSocketDisconnect:
         manager.disconnect(websocket)
 
@@ -312,13 +365,16 @@ async def _run_sync(since_timestamp: Optional[float] = None):
     global sync_state
     
     sync_state.is_syncing = True
+    sync_state.cancel_event = cancelled = asyncio.Event()
     sync_state.current_photo = 0
     sync_state.total_photos = 0
     sync_state.current_filename = ""
     sync_state.downloaded_count = 0
     sync_state.failed_count = 0
     sync_state.bytes_downloaded = 0
+    # Wall-clock start for display; durations come from the monotonic clock
     sync_state.start_time = datetime.now()
+    started = time.monotonic()
     sync_state.error_message = None
     
     await manager.broadcast({
@@ -326,89 +382,110 @@ async def _run_sync(since_timestamp: Optional[float] = None):
         "timestamp": sync_state.start_time.isoformat()
     })
     
+    client = None
     try:
-        with PhotoSyncClient() as client:
-            # Check health first
-            if not client.check_health():
-                sync_state.error_message = "Server health check failed"
-                await manager.broadcast({
-                    "type": "sync_error",
-                    "message": sync_state.error_message
-                })
-                return
-            
-            # Get photos list
+        client = _get_client()
+        _clients_in_use.add(client)
+        # Check health first
+        if not client.check_health():
+            sync_state.error_message = "Server health check failed"
+            await manager.broadcast({
+                "type": "sync_error",
+                "message": sync_state.error_message
+            })
+            return
+        
+        # Get photos list
+        await manager.broadcast({
+            "type": "status_update",
+            "message": "Fetching photo list..."
+        })
+        
+        # Use provided timestamp or last sync time
+        effective_since = since_timestamp or client.get_last_sync_time()
+        
+        # Log what date we're using
+        if effective_since:
+            from datetime import datetime as dt
+            since_str = dt.fromtimestamp(effective_since).isoformat()
             await manager.broadcast({
                 "type": "status_update",
-                "message": "Fetching photo list..."
+                "message": f"Fetching photos since {since_str}"
             })
-            
-            # Use provided timestamp or last sync time
-            effective_since = since_timestamp or client.get_last_sync_time()
-            
-            # Log what date we're using
-            if effective_since:
-                from datetime import datetime as dt
-                since_str = dt.fromtimestamp(effective_since).isoformat()
-                await manager.broadcast({
-                    "type": "status_update",
-                    "message": f"Fetching photos since {since_str}"
-                })
-            else:
-                await manager.broadcast({
-                    "type": "status_update", 
-                    "message": "Fetching ALL photos (no date filter)"
-                })
-            
-            try:
-                photos = client.list_photos(since=effective_since)
-            except Exception as e:
-                sync_state.error_message = f"Failed to list photos: {e}"
-                await manager.broadcast({
-                    "type": "sync_error",
-                    "message": sync_state.error_message
-                })
-                return
-            
-            sync_state.total_photos = len(photos)
-            
+        else:
             await manager.broadcast({
-                "type": "photos_found",
-                "count": sync_state.total_photos
+                "type": "status_update", 
+                "message": "Fetching ALL photos (no date filter)"
             })
-            
-            if not photos:
-                await manager.broadcast({
-                    "type": "sync_complete",
-                    "downloaded": 0,
-                    "failed": 0,
-                    "message": "No new photos to download"
-                })
-                sync_state.last_sync_time = datetime.now()
-                return
-            
-            # Download photos one by one
-            sync_start_time = datetime.now().timestamp()
-            
-            for i, photo in enumerate(photos):
-                if not sync_state.is_syncing:
-                    break
+        
+        try:
+            photos = client.list_photos(since=effective_since)
+        except Exception as e:
+            sync_state.error_message = f"Failed to list photos: {e}"
+            await manager.broadcast({
+                "type": "sync_error",
+                "message": sync_state.error_message
+            })
+            return
+        
+        sync_state.total_photos = len(photos)
+        
+        await manager.broadcast({
+            "type": "photos_found",
+            "count": sync_state.total_photos
+        })
+        
+        if not photos:
+            await manager.broadcast({
+                "type": "sync_complete",
+                "downloaded": 0,
+                "failed": 0,
+                "message": "No new photos to download"
+            })
+            sync_state.last_sync_time = sync_state.start_time + timedelta(seconds=time.monotonic() - started)
+            return
+        
+        # Download photos concurrently, a bounded number at a time
+        sync_start_time = sync_state.start_time.timestamp() + (time.monotonic() - started)
+        pending: list[dict] = []
+        last_flush = time.monotonic()
+        downloads_done = asyncio.Event()
+        
+        async def flush_progress(force: bool = False):
+            """Broadcast queued events once the batch is full or old enough."""
+            nonlocal pending, last_flush
+            now = time.monotonic()
+            if pending and (force or len(pending) >= PROGRESS_BATCH_SIZE
+                            or now - last_flush > PROGRESS_BATCH_INTERVAL):
+                batch, pending = pending, []
+                last_flush = now
+                await manager.broadcast({"type": "progress_batch", "events": batch})
+        
+        async def flush_periodically():
+            """Cap how long an event waits while every download is still in flight."""
+            while not downloads_done.is_set():
+                await asyncio.sleep(PROGRESS_BATCH_INTERVAL)
+                await flush_progress(force=True)
+        
+        semaphore = asyncio.Semaphore(Config.MAX_CONCURRENT_DOWNLOADS)
+        
+        # Estimate display filenames up front, outside the download path
+        names = [
+            parsed.strftime("%Y%m%d_%H%M%S")
+            if (parsed := _try_parse(photo.get("creationDate", "")))
+            else photo["id"][:20]
+            for photo in photos
+        ]
+        
+        async def download(index: int, photo: dict):
+            async with semaphore:
+                if cancelled.is_set():
+                    return None
                 
-                sync_state.current_photo = i + 1
                 photo_id = photo["id"]
+                sync_state.current_filename = names[index]
                 
-                # Estimate filename
-                creation_date = photo.get("creationDate", "")
-                if creation_date:
-                    try:
-                        dt = datetime.fromisoformat(creation_date.replace("Z", "+00:00"))
-                        sync_state.current_filename = dt.strftime("%Y%m%d_%H%M%S")
-                    except:
-                        sync_state.current_filename = photo_id[:20]
-                else:
-                    sync_state.current_filename = photo_id[:20]
-                
-                await manager.broadcast({
+                pending.append({
                     "type": "downloading",
                     "current": sync_state.current_photo,
                     "total": sync_state.total_photos,
@@ -416,53 +493,80 @@ async def _run_sync(since_timestamp: Optional[float] = None):
                     "photo_id": photo_id,
                     "media_type": photo.get("mediaType", "unknown"),
                 })
+                await flush_progress()
                 
-                # Download the photo
-                result = client.download_photo(photo_id, photo)
+                # The client's HTTP pool and download index are thread-safe
+                result = await asyncio.to_thread(client.download_photo, photo_id, photo)
+                return photo_id, result
+        
+        tasks = [asyncio.create_task(download(i, photo)) for i, photo in enumerate(photos)]
+        flusher = asyncio.create_task(flush_periodically())
+        
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                outcome = await next_done
+                if outcome is None:
+                    # Cancelled before this photo started
+                    continue
+                photo_id, result = outcome
+                sync_state.current_photo += 1
                 
                 if result == "skipped":
                     # Already downloaded, skip
-                    await manager.broadcast({
+                    pending.append({
                         "type": "skipped",
                         "current": sync_state.current_photo,
                         "total": sync_state.total_photos,
                         "photo_id": photo_id,
                     })
                 elif result:
+                    output_path, file_size = result
                     sync_state.downloaded_count += 1
-                    file_size = result.stat().st_size if result.exists() else 0
                     sync_state.bytes_downloaded += file_size
                     
-                    await manager.broadcast({
+                    pending.append({
                         "type": "downloaded",
                         "current": sync_state.current_photo,
                         "total": sync_state.total_photos,
-                        "filename": result.name,
+                        "filename": output_path.name,
                         "size": file_size,
                         "size_human": _format_bytes(file_size),
                     })
                 else:
                     sync_state.failed_count += 1
-                    await manager.broadcast({
+                    pending.append({
                         "type": "download_failed",
                         "current": sync_state.current_photo,
                         "total": sync_state.total_photos,
                         "photo_id": photo_id,
                     })
-            
-            # Save sync time
-            client.save_sync_time(sync_start_time)
-            sync_state.last_sync_time = datetime.now()
-            
-            await manager.broadcast({
-                "type": "sync_complete",
-                "downloaded": sync_state.downloaded_count,
-                "failed": sync_state.failed_count,
-                "bytes_total": sync_state.bytes_downloaded,
-                "bytes_total_human": _format_bytes(sync_state.bytes_downloaded),
-                "duration_seconds": (datetime.now() - sync_state.start_time).total_seconds(),
-            })
-            
+                
+                await flush_progress()
+        finally:
+            # Cancelling would not stop a download thread, so stop queued photos
+            # and wait for the running ones before the sync is marked finished
+            cancelled.set()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            # Let the flusher finish its current batch rather than cancelling it
+            downloads_done.set()
+            await flusher
+        
+        await flush_progress(force=True)
+        
+        # Save sync time
+        client.save_sync_time(sync_start_time)
+        duration = time.monotonic() - started
+        sync_state.last_sync_time = sync_state.start_time + timedelta(seconds=duration)
+        
+        await manager.broadcast({
+            "type": "sync_complete",
+            "downloaded": sync_state.downloaded_count,
+            "failed": sync_state.failed_count,
+            "bytes_total": sync_state.bytes_downloaded,
+            "bytes_total_human": _format_bytes(sync_state.bytes_downloaded),
+            "duration_seconds": duration,
+        })
+        
     except Exception as e:
         sync_state.error_message = str(e)
         await manager.broadcast({
@@ -471,6 +575,51 @@ async def _run_sync(since_timestamp: Optional[float] = None):
         })
     finally:
         sync_state.is_syncing = False
+        # Files (and the downloaded-ids index) may have grown since the last scan
+        _stats_cache["key"] = None
+        if client is not None:
+            _clients_in_use.discard(client)
+            # Retired by a settings change while this sync was running
+            if client not in _client_cache.values():
+                client.close()
+
+
+# Last directory scan, keyed on (path, directory mtime)
+_stats_cache = {"key": None, "data": None}
+
+
+def _scan_download_dir(download_dir: Path) -> tuple[int, int, dict]:
+    """Count files, total bytes and per-extension counts in the download directory."""
+    try:
+        key = (str(download_dir), os.stat(download_dir).st_mtime_ns)
+    except FileNotFoundError:
+        return 0, 0, {}
+    
+    # Adding, removing or renaming a file bumps the directory mtime, but growing
+    # one in place does not, so skip the cache while a sync is writing files
+    use_cache = not sync_state.is_syncing
+    if use_cache and _stats_cache["key"] == key:
+        return _stats_cache["data"]
+    
+    file_count = 0
+    total_size = 0
+    file_types = {}
+    
+    with os.scandir(download_dir) as entries:
+        for entry in entries:
+            # The file type comes from the directory read itself; no extra syscall
+            if entry.is_file(follow_symlinks=False):
+                file_count += 1
+                total_size += entry.stat(follow_symlinks=False).st_size
+                stem, _, ext = entry.name.rpartition('.')
+                ext = f".{ext.lower()}" if stem and ext else ""
+                file_types[ext] = file_types.get(ext, 0) + 1
+    
+    data = (file_count, total_size, file_types)
+    if use_cache:
+        _stats_cache["key"] = key
+        _stats_cache["data"] = data
+    return data
 
 
 def _get_last_sync_timestamp() -> Optional[float]:
@@ -478,19 +627,53 @@ def _get_last_sync_timestamp() -> Optional[float]:
     if not Config.STATE_FILE.exists():
         return None
     try:
-        state = json.loads(Config.STATE_FILE.read_text())
+        state = orjson.loads(Config.STATE_FILE.read_bytes())
         return state.get("last_sync_timestamp")
     except:
         return None
 
 
+def _parse_iso_z(value: str) -> datetime:
+    """Parse an ISO 8601 timestamp, with a fast path for the server's ``YYYY-MM-DDTHH:MM:SSZ``."""
+    if (len(value) == 20 and value[19] == "Z" and value[10] == "T"
+            and value[4] == value[7] == "-" and value[13] == value[16] == ":"):
+        digits = value[0:4] + value[5:7] + value[8:10] + value[11:13] + value[14:16] + value[17:19]
+        # int() alone would also accept signs, spaces and non-ASCII digits
+        if digits.isascii() and digits.isdigit():
+            try:
+                return datetime(
+                    int(value[0:4]), int(value[5:7]), int(value[8:10]),
+                    int(value[11:13]), int(value[14:16]), int(value[17:19]),
+                    tzinfo=timezone.utc,
+                )
+            except ValueError:
+                pass
+    return datetime.fromisoformat(value.replace("Z", "+00:00"))
+
+
+def _try_parse(value: str) -> Optional[datetime]:
+    """Parse an ISO 8601 timestamp, returning None if it is missing or malformed."""
+    if not value:
+        return None
+    try:
+        return _parse_iso_z(value)
+    except ValueError:
+        return None
+
+
+_BYTE_UNITS = ('B', 'KB', 'MB', 'GB', 'TB', 'PB')
+
+# Preformatted strings for every size below 1 KB
+_SMALL = [f"{i}.0 B" for i in range(1024)]
+
+
 def _format_bytes(size: int) -> str:
     """Format bytes to human readable string."""
-    for unit in ['B', 'KB', 'MB', 'GB', 'TB']:
-        if size < 1024:
-            return f"{size:.1f} {unit}"
-        size /= 1024
-    return f"{size:.1f} PB"
+    if 0 <= size < 1024:
+        return _SMALL[size]
+    # Each unit is 10 bits wide, so the bit length picks the unit directly
+    i = min((size.bit_length() - 1) // 10, 5) if size > 0 else 0
+    return f"{size / (1 << (i * 10)):.1f} {_BYTE_UNITS[i]}"
 
 
 if __name__ == "__main__":
@@ -1,4 +1,5 @@
 import Vapor
+import Crypto
 import Photos
 
 struct PhotoController: RouteCollection {
@@ -15,8 +16,9 @@ struct PhotoController: RouteCollection {
     
     /// GET /photos?since=<unix_timestamp>
     /// Returns list of photo metadata for photos created after the given timestamp
+    /// The body is tagged with an ETag; a matching If-None-Match gets 304 Not Modified
     @Sendable
-    func listPhotos(req: Request) async throws -> PhotoListResponse {
+    func listPhotos(req: Request) async throws -> Response {
         // Parse optional 'since' query parameter
         let sinceTimestamp: Double? = req.query["since"]
         let sinceDate = sinceTimestamp.map { Date(timeIntervalSince1970: $0) }
@@ -25,10 +27,25 @@ struct PhotoController: RouteCollection {
         
         let photos = try await PhotoLibraryService.shared.fetchPhotos(since: sinceDate)
         
-        return PhotoListResponse(
+        let response = try await PhotoListResponse(
             count: photos.count,
             photos: photos
-        )
+        ).encodeResponse(for: req)
+        
+        guard let body = response.body.data else {
+            return response
+        }
+        
+        let etag = "\"\(SHA256.hash(data: body).hex)\""
+        response.headers.replaceOrAdd(name: .eTag, value: etag)
+        
+        if req.headers.first(name: .ifNoneMatch) == etag {
+            var headers = HTTPHeaders()
+            headers.add(name: .eTag, value: etag)
+            return Response(status: .notModified, headers: headers)
+        }
+        
+        return response
     }
     
     // MARK: - Get Photo Metadata